@@ -6,17 +6,21 @@ import socket
 import sys
 import subprocess
 from sentinel.config import SOCKET_PATH
-from sentinel.watchdog import get_ssh_sessions, get_guest_sessions
+from sentinel.protocol import send_msg, recv_msg
+from sentinel.watchdog import read_utmp, get_ssh_sessions, get_guest_sessions
 
 print("=" * 60)
 print("SENTINEL DEBUG")
 print("=" * 60)
 
-# Test 1: Check who output
-print("\n[1] Raw 'who' output:")
+# Test 1: Check utmp login records
+print("\n[1] Raw utmp login records:")
 print("-" * 60)
-result = subprocess.run(["who"], capture_output=True, text=True)
-print(result.stdout)
+try:
+    for r in read_utmp():
+        print(f"  {r.user:<15} {r.tty:<10} {r.time}  from={r.from_}")
+except OSError as e:
+    print(f"  ERROR reading utmp: {e}")
 
 # Test 2: Check parsed SSH sessions
 print("\n[2] Parsed SSH sessions:")
@@ -24,7 +28,7 @@ print("-" * 60)
 sessions = get_ssh_sessions()
 if sessions:
     for s in sessions:
-        print(f"  {s['user']:<15} {s['tty']:<10} from={s['from']}")
+        print(f"  {s.user:<15} {s.tty:<10} from={s.from_}")
 else:
     print("  (none detected)")
 
@@ -34,7 +38,7 @@ print("-" * 60)
 guests = get_guest_sessions(sessions, "benjamin")
 if guests:
     for g in guests:
-        print(f"  {g['user']:<15} {g['tty']:<10} from={g['from']}")
+        print(f"  {g.user:<15} {g.tty:<10} from={g.from_}")
 else:
     print("  (none - only owner connected)")
 
@@ -45,10 +49,9 @@ try:
     s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
     s.settimeout(3)
     s.connect(SOCKET_PATH)
-    s.sendall(json.dumps({"cmd": "status"}).encode())
-    data = s.recv(4096).decode()
+    send_msg(s, {"cmd": "status"})
+    status = recv_msg(s)
     s.close()
-    status = json.loads(data)
     print(json.dumps(status, indent=2))
 except Exception as e:
     print(f"ERROR: {e}")
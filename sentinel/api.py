@@ -9,14 +9,18 @@ Endpoints:
   POST /v1/*         → proxy to Ollama (gated by sentinel state)
 """
 
+import atexit
+import http.client
 import json
 import logging
+import queue
+import shutil
 import socket
 import subprocess
 import threading
-import urllib.error
-import urllib.request
-from http.server import BaseHTTPRequestHandler, HTTPServer
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
@@ -25,10 +29,52 @@ if TYPE_CHECKING:
 log = logging.getLogger("sentinel.api")
 
 OLLAMA_BASE = "http://localhost:11434"
+PROBE_TIMEOUT = 5   # seconds to wait on each probe before giving up on it
+PROXY_BUFSIZE = 64 * 1024
+OLLAMA_POOL_SIZE = 32  # idle keep-alive connections kept open to Ollama
+
+_OLLAMA_ADDR = urllib.parse.urlsplit(OLLAMA_BASE)
+# Per-hop headers that must not be forwarded in either direction
+_HOP_HEADERS = frozenset({"connection", "keep-alive", "transfer-encoding"})
+
+STREAM_JSON_ITEMS = 64  # send_json streams payloads with more entries than this
+
+_COMPACT_JSON = json.JSONEncoder(separators=(",", ":"))
+_PRETTY_JSON = json.JSONEncoder(indent=2)
+
+UNKNOWN_GPU = {"name": "unknown", "total_vram_mb": 0, "free_vram_mb": 0, "used_vram_mb": 0}
+
+# NVML is optional — without it (or without a driver) we fall back to nvidia-smi
+try:
+    import pynvml
+    pynvml.nvmlInit()
+    _NVML_HANDLE = pynvml.nvmlDeviceGetHandleByIndex(0)
+    atexit.register(pynvml.nvmlShutdown)
+except Exception:
+    _NVML_HANDLE = None
+
+
+def _nvml_gpu_info() -> dict:
+    """Current VRAM stats straight from NVML — no fork, no text parsing."""
+    mem = pynvml.nvmlDeviceGetMemoryInfo(_NVML_HANDLE)
+    name = pynvml.nvmlDeviceGetName(_NVML_HANDLE)
+    if isinstance(name, bytes):  # older pynvml releases return bytes
+        name = name.decode()
+    return {
+        "name": name,
+        "total_vram_mb": mem.total >> 20,
+        "free_vram_mb": mem.free >> 20,
+        "used_vram_mb": mem.used >> 20,
+    }
 
 
 def get_gpu_info() -> dict:
-    """Current VRAM stats from nvidia-smi."""
+    """Current VRAM stats via NVML, or nvidia-smi if NVML is unavailable."""
+    if _NVML_HANDLE is not None:
+        try:
+            return _nvml_gpu_info()
+        except Exception as e:
+            log.debug(f"NVML query failed, falling back to nvidia-smi: {e}")
     try:
         result = subprocess.run(
             ["nvidia-smi",
@@ -44,14 +90,60 @@ def get_gpu_info() -> dict:
             "used_vram_mb": int(parts[3]),
         }
     except Exception:
-        return {"name": "unknown", "total_vram_mb": 0, "free_vram_mb": 0, "used_vram_mb": 0}
+        return dict(UNKNOWN_GPU)
+
+
+_idle_conns: queue.LifoQueue = queue.LifoQueue(maxsize=OLLAMA_POOL_SIZE)
+
+
+def _ollama_request(method: str, path: str, body: bytes = None,
+                    headers: dict = None, timeout: float = 300):
+    """
+    Send a request to Ollama over a pooled keep-alive connection.
+    Returns (conn, resp); hand both back via _ollama_release() when done.
+    Pooled sockets go stale whenever Ollama restarts, so a reused connection
+    that fails before any response arrives is dropped and the next one tried.
+    """
+    while True:
+        try:
+            conn = _idle_conns.get_nowait()
+            conn.sock.settimeout(timeout)
+            reused = True
+        except queue.Empty:
+            conn = http.client.HTTPConnection(
+                _OLLAMA_ADDR.hostname, _OLLAMA_ADDR.port, timeout=timeout)
+            reused = False
+        try:
+            conn.request(method, path, body=body, headers=headers or {})
+            return conn, conn.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            if not reused:
+                raise
+        except Exception:
+            conn.close()
+            raise
+
+
+def _ollama_release(conn: http.client.HTTPConnection, resp: http.client.HTTPResponse):
+    """Return conn to the pool if resp was read to the end, otherwise close it."""
+    if resp.isclosed() and not resp.will_close:
+        try:
+            _idle_conns.put_nowait(conn)
+            return
+        except queue.Full:
+            pass
+    conn.close()
 
 
 def get_loaded_models() -> list:
     """Models currently loaded in Ollama VRAM via /api/ps."""
     try:
-        with urllib.request.urlopen(f"{OLLAMA_BASE}/api/ps", timeout=5) as resp:
+        conn, resp = _ollama_request("GET", "/api/ps", timeout=5)
+        try:
             data = json.loads(resp.read())
+        finally:
+            _ollama_release(conn, resp)
         return [
             {
                 "name": m["name"],
@@ -63,14 +155,65 @@ def get_loaded_models() -> list:
         return []
 
 
+_probe_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="sentinel-probe")
+
+
+def probe_capacity() -> tuple[dict, list]:
+    """Run the GPU and Ollama probes concurrently — latency is max(), not sum()."""
+    gpu_f = _probe_pool.submit(get_gpu_info)
+    models_f = _probe_pool.submit(get_loaded_models)
+    try:
+        gpu = gpu_f.result(timeout=PROBE_TIMEOUT)
+    except FutureTimeout:
+        gpu = dict(UNKNOWN_GPU)
+    try:
+        models = models_f.result(timeout=PROBE_TIMEOUT)
+    except FutureTimeout:
+        models = []
+    return gpu, models
+
+
+def _json_size_hint(data: dict) -> int:
+    """Rough entry count: top-level keys plus the length of any list/dict values."""
+    return sum(len(v) if isinstance(v, (list, dict)) else 1 for v in data.values())
+
+
 class SentinelHandler(BaseHTTPRequestHandler):
     daemon: "SentinelDaemon" = None  # injected at server start
+    slots: threading.BoundedSemaphore = None  # injected at server start
+    pretty = False  # set per request from ?pretty=1
+
+    def handle(self):
+        # Bound the number of connections served at once; the rest queue here
+        with self.slots:
+            super().handle()
 
     def log_message(self, fmt, *args):
         log.debug(f"{self.address_string()} {fmt % args}")
 
     def send_json(self, data: dict, code: int = 200):
-        body = json.dumps(data, indent=2).encode()
+        # Compact by default — callers are programs; ?pretty=1 is for humans
+        encoder = _PRETTY_JSON if self.pretty else _COMPACT_JSON
+        if _json_size_hint(data) <= STREAM_JSON_ITEMS:
+            self.send_json_bytes(encoder.encode(data).encode(), code)
+            return
+        # Large payload: encode incrementally and let the socket drain as we go.
+        # No Content-Length — the HTTP/1.0 connection close ends the body.
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        pending, size = [], 0
+        for chunk in encoder.iterencode(data):
+            pending.append(chunk)
+            size += len(chunk)
+            if size >= PROXY_BUFSIZE:
+                self.wfile.write("".join(pending).encode())
+                pending, size = [], 0
+        if pending:
+            self.wfile.write("".join(pending).encode())
+
+    def send_json_bytes(self, body: bytes, code: int = 200):
+        """Send an already-encoded JSON body."""
         self.send_response(code)
         self.send_header("Content-Type", "application/json")
         self.send_header("Content-Length", str(len(body)))
@@ -91,11 +234,16 @@ class SentinelHandler(BaseHTTPRequestHandler):
     # ------------------------------------------------------------------ #
 
     def do_GET(self):
-        if self.path == "/capacity":
+        url = urllib.parse.urlsplit(self.path)
+        self.pretty = "pretty=1" in url.query.split("&")
+        if url.path == "/capacity":
             self._handle_capacity()
-        elif self.path == "/status":
-            self.send_json(self.daemon.get_status())
-        elif self.path.startswith("/v1/"):
+        elif url.path == "/status":
+            if self.pretty:
+                self.send_json(self.daemon.get_status())
+            else:
+                self.send_json_bytes(self.daemon.get_status_bytes())
+        elif url.path.startswith("/v1/"):
             self._proxy()
         else:
             self.send_json({"error": "not found"}, 404)
@@ -117,8 +265,7 @@ class SentinelHandler(BaseHTTPRequestHandler):
     # ------------------------------------------------------------------ #
 
     def _handle_capacity(self):
-        gpu = get_gpu_info()
-        models = get_loaded_models()
+        snapshot = self.daemon.gpu_snapshot  # kept fresh by the daemon's refresher
         status = self.daemon.get_status()
         accepting, reason = self._accepting()
         self.send_json({
@@ -126,8 +273,8 @@ class SentinelHandler(BaseHTTPRequestHandler):
             "accepting_requests": accepting,
             "unavailable_reason": reason,
             "sentinel_state": status["state"],
-            "gpu": gpu,
-            "loaded_models": models,
+            "gpu": snapshot["gpu"],
+            "loaded_models": snapshot["loaded_models"],
             "ssh_sessions": status.get("ssh_sessions", []),
             "owner_user": status.get("owner_user", ""),
         })
@@ -146,46 +293,68 @@ class SentinelHandler(BaseHTTPRequestHandler):
         content_length = int(self.headers.get("Content-Length", 0))
         body = self.rfile.read(content_length) if content_length else None
 
-        target = f"{OLLAMA_BASE}{self.path}"
-        req = urllib.request.Request(target, data=body, method=self.command)
-        for key, val in self.headers.items():
-            if key.lower() not in ("host", "content-length"):
-                req.add_header(key, val)
+        headers = {key: val for key, val in self.headers.items()
+                   if key.lower() not in _HOP_HEADERS
+                   and key.lower() not in ("host", "content-length")}
+
+        try:
+            conn, resp = _ollama_request(self.command, self.path, body, headers)
+        except (OSError, http.client.HTTPException) as e:
+            self.send_json({"error": "ollama_unreachable", "detail": str(e)}, 502)
+            return
 
         try:
-            with urllib.request.urlopen(req, timeout=300) as resp:
-                self.send_response(resp.status)
-                for key, val in resp.headers.items():
-                    # Let our own layer handle transfer encoding
-                    if key.lower() == "transfer-encoding":
-                        continue
-                    self.send_header(key, val)
-                self.end_headers()
-                # Stream in chunks so large/streamed responses don't buffer
+            self.send_response(resp.status)
+            for key, val in resp.headers.items():
+                # Let our own layer handle transfer encoding and keep-alive
+                if key.lower() in _HOP_HEADERS:
+                    continue
+                self.send_header(key, val)
+            self.end_headers()
+            if resp.headers.get_content_type() == "text/event-stream":
+                # SSE token streams: forward each chunk as soon as it arrives
                 while True:
-                    chunk = resp.read(8192)
+                    chunk = resp.read1(PROXY_BUFSIZE)
                     if not chunk:
                         break
                     self.wfile.write(chunk)
                     self.wfile.flush()
-        except urllib.error.HTTPError as e:
-            err_body = e.read()
-            self.send_response(e.code)
-            self.send_header("Content-Type", "application/json")
-            self.send_header("Content-Length", str(len(err_body)))
-            self.end_headers()
-            self.wfile.write(err_body)
-        except urllib.error.URLError as e:
-            self.send_json({"error": "ollama_unreachable", "detail": str(e)}, 502)
+            elif resp.length is not None:
+                self._copy_fixed_length(resp)
+            else:
+                shutil.copyfileobj(resp, self.wfile, PROXY_BUFSIZE)
         except (BrokenPipeError, ConnectionResetError):
             pass  # client disconnected mid-stream, normal for cancelled requests
+        finally:
+            _ollama_release(conn, resp)
+
+    def _copy_fixed_length(self, resp: http.client.HTTPResponse):
+        """
+        Copy a Content-Length (non-chunked) body through one reusable buffer,
+        so no bytes object is created per chunk.
+        """
+        buf = bytearray(max(1, min(resp.length, PROXY_BUFSIZE)))
+        view = memoryview(buf)
+        while True:
+            n = resp.readinto(buf)
+            if not n:
+                break
+            self.wfile.write(view[:n])
 
 
-def start_api_server(daemon: "SentinelDaemon", host: str, port: int) -> HTTPServer:
-    """Start the HTTP API server in a daemon thread. Returns the server."""
+def start_api_server(daemon: "SentinelDaemon", host: str, port: int,
+                     max_threads: int = 16) -> ThreadingHTTPServer:
+    """
+    Start the HTTP API server in a daemon thread. Returns the server.
+    Each connection gets its own thread so a long /v1 stream doesn't block
+    /capacity or /status; at most max_threads are served concurrently.
+    """
     # Bind daemon into handler class so threads don't share mutable state
-    handler = type("BoundHandler", (SentinelHandler,), {"daemon": daemon})
-    server = HTTPServer((host, port), handler)
+    handler = type("BoundHandler", (SentinelHandler,), {
+        "daemon": daemon,
+        "slots": threading.BoundedSemaphore(max_threads),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
     t = threading.Thread(target=server.serve_forever, daemon=True)
     t.start()
     log.info(f"Sentinel HTTP API on {host}:{port}  —  /capacity  /status  /v1/*")
@@ -1,7 +1,8 @@
+import functools
 import os
 import tomllib
-from dataclasses import dataclass, field
-from typing import List
+from dataclasses import dataclass, field, fields
+from typing import List, Optional
 
 DEFAULT_CONFIG_PATH = "/etc/sentinel/config.toml"
 LOCK_FILE = "/var/run/sentinel.lock"
@@ -30,13 +31,21 @@ class InferenceConfig:
 @dataclass
 class WatchdogConfig:
     poll_interval: int = 5
+    max_poll_interval: int = 60  # backoff cap while sessions are unchanged (utmp watch only)
     owner_user: str = "benjamin"
+    idle_priority: bool = False  # run the watchdog thread under SCHED_IDLE
+    cpu: Optional[int] = None  # pin the watchdog thread to this core
+
+# Keys accepted from [watchdog]; anything else (e.g. legacy ignored_processes) is dropped
+_WATCHDOG_KEYS = frozenset(f.name for f in fields(WatchdogConfig))
 
 @dataclass
 class WebConfig:
     enabled: bool = True
     port: int = 8765
     host: str = "0.0.0.0"
+    http_threads: int = 16  # max HTTP connections served concurrently
+    capacity_refresh_interval: float = 2  # seconds between GPU/model snapshots for /capacity
 
 @dataclass
 class Config:
@@ -45,7 +54,21 @@ class Config:
     web: WebConfig = field(default_factory=WebConfig)
 
 def load_config(path: str = DEFAULT_CONFIG_PATH) -> Config:
-    if not os.path.exists(path):
+    """
+    Parsed config for path. Results are cached per (path, mtime), so repeat
+    calls skip the TOML parse but an edited file is still picked up.
+    The returned Config is shared — treat it as read-only.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    return _load_config(path, mtime)
+
+
+@functools.lru_cache(maxsize=4)
+def _load_config(path: str, mtime: Optional[int]) -> Config:
+    if mtime is None:
         return Config()
     with open(path, "rb") as f:
         raw = tomllib.load(f)
@@ -53,8 +76,7 @@ def load_config(path: str = DEFAULT_CONFIG_PATH) -> Config:
     if "inference" in raw:
         cfg.inference = InferenceConfig(**raw["inference"])
     if "watchdog" in raw:
-        known = {k: v for k, v in raw["watchdog"].items()
-                 if k in ("poll_interval", "owner_user")}
+        known = {k: v for k, v in raw["watchdog"].items() if k in _WATCHDOG_KEYS}
         cfg.watchdog = WatchdogConfig(**known)
     if "web" in raw:
         cfg.web = WebConfig(**raw["web"])
@@ -9,15 +9,19 @@ import json
 import socket
 import signal
 import logging
+import queue
+import selectors
 import subprocess
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 from .config import load_config, SOCKET_PATH, STATE_FILE
-from .watchdog import Watchdog
-from .api import start_api_server
+from .protocol import recv_msg, send_frame
+from .watchdog import Session, Watchdog, get_guest_sessions
+from .api import start_api_server, get_gpu_info, probe_capacity, UNKNOWN_GPU
 
 logging.basicConfig(
     level=logging.INFO,
@@ -25,6 +29,11 @@ logging.basicConfig(
 )
 log = logging.getLogger("sentinel.daemon")
 
+CLIENT_IDLE_TIMEOUT = 30  # seconds a socket client may sit idle between commands
+CLIENT_FRAME_TIMEOUT = 5  # seconds to finish sending a command once it has started
+MIN_POLL_TICK = 0.5  # floor for _poller's tick; a zero or tiny interval would spin
+WATCHDOG_QUEUE_SIZE = 64  # pending watchdog events before new ones are dropped
+
 
 class State:
     IDLE = "idle"           # GPU free, inference running
@@ -39,9 +48,24 @@ class SentinelDaemon:
         self.lock_holder: Optional[str] = None
         self.lock_since: Optional[str] = None
         self.lock_count = 0  # reference count — multiple research processes can stack
-        self.ssh_sessions: list = []
+        self.ssh_sessions: List[Session] = []
         self._lock = threading.RLock()
-        self._running = False
+        self._state_version = 0  # bumped by every mutation visible in get_status()
+        self._status_json_cache = (None, b"")  # (state version, json bytes)
+        self._inference_running = False  # tracked on our own start/stop, reconciled periodically
+        self._svc_generation = 0  # bumped around our own start/stop; stale reconciles are dropped
+        self._stop_event = threading.Event()  # set on shutdown; wakes every sleeper
+        self._wake_r, self._wake_w = os.pipe()  # self-pipe to interrupt the socket server
+        os.set_blocking(self._wake_w, False)  # required by signal.set_wakeup_fd
+        self._watchdog_events: queue.Queue = queue.Queue(maxsize=WATCHDOG_QUEUE_SIZE)
+        self._pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="sentinel-rpc")
+        # Open client sockets; shut down on exit so blocked pool workers return
+        # (they are non-daemon threads, so the interpreter waits for them)
+        self._conns: set = set()
+        self._conns_lock = threading.Lock()
+        self._parked: queue.SimpleQueue = queue.SimpleQueue()  # served clients to watch again
+        # Latest GPU/model probe for /capacity, swapped whole by _refresh_gpu_snapshot
+        self.gpu_snapshot = {"gpu": dict(UNKNOWN_GPU), "loaded_models": []}
 
     # ------------------------------------------------------------------ #
     # Inference service control
@@ -54,19 +78,52 @@ class SentinelDaemon:
         return result.returncode == 0
 
     def pause_inference(self, reason: str = ""):
+        self._bump_service_generation()
         if self._service_running():
             log.info(f"Pausing inference service ({reason})")
-            subprocess.run(["systemctl", "stop", self.config.inference.service], check=False)
+            result = subprocess.run(["systemctl", "stop", self.config.inference.service], check=False)
+            self._set_inference_running(result.returncode != 0)
         else:
             log.debug("Inference service already stopped")
+            self._set_inference_running(False)
 
     def resume_inference(self):
         delay = self.config.inference.restart_delay
         if delay > 0:
             log.info(f"Waiting {delay}s before resuming inference...")
-            time.sleep(delay)
+            if self._stop_event.wait(delay):
+                log.info("Shutting down, not resuming inference")
+                return
         log.info("Resuming inference service")
-        subprocess.run(["systemctl", "start", self.config.inference.service], check=False)
+        self._bump_service_generation()
+        result = subprocess.run(["systemctl", "start", self.config.inference.service], check=False)
+        self._set_inference_running(result.returncode == 0)
+
+    def _bump_service_generation(self):
+        with self._lock:
+            self._svc_generation += 1
+
+    def _set_inference_running(self, running: bool, generation: Optional[int] = None):
+        """
+        Record whether the service is running. Our own start/stop results
+        (generation None) always apply and invalidate in-flight reconciles;
+        a reconcile passes the generation it read before probing and is
+        dropped if a start/stop happened meanwhile, as its probe is stale.
+        """
+        with self._lock:
+            if generation is None:
+                self._svc_generation += 1
+            elif generation != self._svc_generation:
+                return
+            if running != self._inference_running:
+                self._inference_running = running
+                self._state_version += 1
+
+    def _reconcile_inference(self):
+        """Re-read the real service state, catching systemctl use outside Sentinel."""
+        with self._lock:
+            generation = self._svc_generation
+        self._set_inference_running(self._service_running(), generation)
 
     # ------------------------------------------------------------------ #
     # State transitions
@@ -75,6 +132,7 @@ class SentinelDaemon:
     def acquire(self, holder: str) -> dict:
         with self._lock:
             self.lock_count += 1
+            self._state_version += 1
             if self.state == State.IDLE:
                 self.state = State.RESEARCH
                 self.lock_holder = holder
@@ -89,12 +147,12 @@ class SentinelDaemon:
     def release(self, holder: str) -> dict:
         with self._lock:
             self.lock_count = max(0, self.lock_count - 1)
+            self._state_version += 1
             if self.lock_count == 0 and self.state == State.RESEARCH:
                 # Don't resume if guests are still connected
-                from .watchdog import get_guest_sessions
                 guests = get_guest_sessions(self.ssh_sessions, self.config.watchdog.owner_user)
                 if guests:
-                    guest_users = {s["user"] for s in guests}
+                    guest_users = {s.user for s in guests}
                     self.lock_holder = f"ssh:{','.join(sorted(guest_users))}"
                     self._write_state()
                     return {"ok": True, "message": f"Lock released but guests still connected: {guest_users}"}
@@ -113,10 +171,21 @@ class SentinelDaemon:
                 self.state = State.RESEARCH
                 self.lock_holder = f"ssh:{','.join(sorted(holders))}"
                 self.lock_since = datetime.now().isoformat()
+                self._state_version += 1
                 self._write_state()
                 threading.Thread(target=self.pause_inference, args=("ssh watchdog detection",), daemon=True).start()
         return {"ok": True}
 
+    def update_ssh_holders(self, added: set, removed: set):
+        """Called by watchdog when guests come or go while others stay on."""
+        with self._lock:
+            if self.lock_count or not (self.lock_holder or "").startswith("ssh:"):
+                return  # a sentinel-request lock names the holder, not the guests
+            holders = (set(self.lock_holder[4:].split(",")) | added) - removed
+            self.lock_holder = f"ssh:{','.join(sorted(holders))}"
+            self._state_version += 1
+            self._write_state()
+
     def force_free(self) -> dict:
         """Called by watchdog when GPU is clear."""
         with self._lock:
@@ -124,10 +193,22 @@ class SentinelDaemon:
                 self.state = State.IDLE
                 self.lock_holder = None
                 self.lock_since = None
+                self._state_version += 1
                 self._write_state()
                 threading.Thread(target=self.resume_inference, daemon=True).start()
         return {"ok": True}
 
+    def _update_sessions(self, sessions: List[Session]):
+        """
+        Called by watchdog with the current SSH session list. Identical
+        successive polls (nobody logged in or out) change nothing, so the
+        cached status JSON stays valid.
+        """
+        with self._lock:
+            if sessions != self.ssh_sessions:
+                self.ssh_sessions = sessions
+                self._state_version += 1
+
     def get_status(self) -> dict:
         with self._lock:
             return {
@@ -136,42 +217,139 @@ class SentinelDaemon:
                 "lock_since": self.lock_since,
                 "lock_count": self.lock_count,
                 "inference_service": self.config.inference.service,
-                "inference_running": self._service_running(),
-                "ssh_sessions": self.ssh_sessions,
+                "inference_running": self._inference_running,
+                "ssh_sessions": [s.to_dict() for s in self.ssh_sessions],
                 "owner_user": self.config.watchdog.owner_user,
             }
 
+    def get_status_bytes(self) -> bytes:
+        """get_status() as compact JSON, re-encoded only when something changed."""
+        with self._lock:
+            if self._status_json_cache[0] != self._state_version:
+                body = json.dumps(self.get_status(), separators=(",", ":")).encode()
+                self._status_json_cache = (self._state_version, body)
+            return self._status_json_cache[1]
+
     def _write_state(self):
         try:
-            with open(STATE_FILE, "w") as f:
-                json.dump(self.get_status(), f)
+            with open(STATE_FILE, "wb") as f:
+                f.write(self.get_status_bytes())
         except OSError:
             pass
 
+    def _refresh_gpu_snapshot(self):
+        """
+        Refresh gpu_snapshot so /capacity never does I/O itself.
+        While research holds the GPU Ollama is stopped, so /api/ps is skipped.
+        """
+        if self.state == State.RESEARCH:
+            snapshot = {"gpu": get_gpu_info(), "loaded_models": []}
+        else:
+            gpu, models = probe_capacity()
+            snapshot = {"gpu": gpu, "loaded_models": models}
+        self.gpu_snapshot = snapshot
+
+    def _poller(self):
+        """
+        One background loop for the daemon's periodic probes. The cheap
+        /capacity snapshot runs every tick; the systemctl reconciliation
+        (a fork) only every Nth tick, so it doesn't set the fast probe's pace.
+        """
+        web = self.config.web.enabled
+        poll = self.config.watchdog.poll_interval
+        tick = max(self.config.web.capacity_refresh_interval if web else poll, MIN_POLL_TICK)
+        reconcile_every = max(1, round(poll / tick))
+        ticks = 0
+        while not self._stop_event.is_set():
+            if web:
+                try:
+                    self._refresh_gpu_snapshot()
+                except Exception as e:
+                    log.error(f"Error refreshing GPU snapshot: {e}")
+            if self._stop_event.wait(tick):
+                break
+            ticks += 1
+            if ticks % reconcile_every == 0:
+                try:
+                    self._reconcile_inference()
+                except Exception as e:
+                    log.error(f"Error reconciling inference state: {e}")
+
+    # ------------------------------------------------------------------ #
+    # Watchdog events
+    # ------------------------------------------------------------------ #
+
+    # kind → handler(self, **payload), for events queued by Watchdog
+    _WATCHDOG_EVENTS = {
+        "sessions": lambda self, sessions: self._update_sessions(sessions),
+        "taken": lambda self, source, users: self.force_pause(users),
+        "free": lambda self, source: self.force_free(),
+        "roster": lambda self, added, removed: self.update_ssh_holders(added, removed),
+    }
+
+    def _watchdog_consumer(self):
+        """Apply watchdog events in order, off the watchdog's poll thread."""
+        while True:
+            kind, payload = self._watchdog_events.get()
+            try:
+                type(self)._WATCHDOG_EVENTS[kind](self, **payload)
+            except Exception as e:
+                log.error(f"Error handling watchdog event {kind!r}: {e}")
+
     # ------------------------------------------------------------------ #
     # Unix socket server
     # ------------------------------------------------------------------ #
 
+    # cmd → handler(self, msg). Handlers return a reply dict, or bytes that
+    # are already encoded JSON (status is served from its cache).
+    _DISPATCH = {
+        "acquire": lambda self, msg: self.acquire(msg.get("holder", "unknown")),
+        "release": lambda self, msg: self.release(msg.get("holder", "unknown")),
+        "status": lambda self, msg: self.get_status_bytes(),
+    }
+
+    def _unknown_command(self, msg: dict) -> dict:
+        return {"ok": False, "message": f"Unknown command: {msg.get('cmd')}"}
+
+    def _dispatch(self, msg: dict) -> bytes:
+        """Run one command and return its reply as encoded JSON."""
+        if not isinstance(msg, dict):
+            # Answered in place, so a batch still gets one result per command
+            resp = {"ok": False, "message": f"Malformed command: expected an object, got {type(msg).__name__}"}
+        else:
+            handler = type(self)._DISPATCH.get(msg.get("cmd"))
+            resp = handler(self, msg) if handler else self._unknown_command(msg)
+        return resp if isinstance(resp, bytes) else json.dumps(resp).encode()
+
     def _handle_client(self, conn: socket.socket):
+        """
+        Serve one framed command, then hand the connection back to the
+        socket server to wait for the next one, so an idle long-lived
+        client (e.g. a monitor) doesn't hold a pool worker between polls.
+        A frame holding a JSON list is a batch: each command runs in order
+        and the reply is the list of their results, in one round trip.
+        """
         try:
-            data = conn.recv(4096).decode()
-            msg = json.loads(data)
-            cmd = msg.get("cmd")
-
-            if cmd == "acquire":
-                resp = self.acquire(msg.get("holder", "unknown"))
-            elif cmd == "release":
-                resp = self.release(msg.get("holder", "unknown"))
-            elif cmd == "status":
-                resp = self.get_status()
-            else:
-                resp = {"ok": False, "message": f"Unknown command: {cmd}"}
-
-            conn.sendall(json.dumps(resp).encode())
+            msg = recv_msg(conn)
+            if msg is not None:
+                if isinstance(msg, list):
+                    send_frame(conn, b"[" + b",".join(self._dispatch(m) for m in msg) + b"]")
+                else:
+                    send_frame(conn, self._dispatch(msg))
+                if not self._stop_event.is_set():
+                    self._parked.put(conn)
+                    self._wake()
+                    return
+        except TimeoutError:
+            pass  # client stalled mid-frame; free the worker
         except Exception as e:
             log.error(f"Error handling client: {e}")
-        finally:
-            conn.close()
+        self._close_client(conn)
+
+    def _close_client(self, conn: socket.socket):
+        with self._conns_lock:
+            self._conns.discard(conn)
+        conn.close()
 
     def _socket_server(self):
         if os.path.exists(SOCKET_PATH):
@@ -180,52 +358,95 @@ class SentinelDaemon:
         server.bind(SOCKET_PATH)
         os.chmod(SOCKET_PATH, 0o666)
         server.listen(5)
-        server.settimeout(1)
+        # Clients waiting for their next command are registered with their
+        # last-activity time as data; server and wake pipe carry None.
+        sel = selectors.DefaultSelector()
+        sel.register(server, selectors.EVENT_READ)
+        sel.register(self._wake_r, selectors.EVENT_READ)
         log.info(f"Listening on {SOCKET_PATH}")
-        while self._running:
-            try:
-                conn, _ = server.accept()
-                threading.Thread(target=self._handle_client, args=(conn,), daemon=True).start()
-            except socket.timeout:
-                continue
+        while not self._stop_event.is_set():
+            for key, _ in sel.select(timeout=CLIENT_IDLE_TIMEOUT):
+                if key.fileobj is server:
+                    conn, _ = server.accept()
+                    conn.settimeout(CLIENT_FRAME_TIMEOUT)
+                    with self._conns_lock:
+                        self._conns.add(conn)
+                    sel.register(conn, selectors.EVENT_READ, time.monotonic())
+                elif key.data is not None:
+                    sel.unregister(key.fileobj)  # a worker owns it until it's parked again
+                    self._pool.submit(self._handle_client, key.fileobj)
+                else:
+                    os.read(self._wake_r, 64)  # woken by _wake(); loop re-checks _stop_event
+            while not self._parked.empty():
+                sel.register(self._parked.get(), selectors.EVENT_READ, time.monotonic())
+            now = time.monotonic()
+            for key in list(sel.get_map().values()):
+                if key.data is not None and now - key.data > CLIENT_IDLE_TIMEOUT:
+                    sel.unregister(key.fileobj)
+                    self._close_client(key.fileobj)
+        for key in list(sel.get_map().values()):
+            if key.data is not None:
+                self._close_client(key.fileobj)
+        sel.close()
         server.close()
+        with self._conns_lock:
+            for conn in self._conns:
+                try:
+                    conn.shutdown(socket.SHUT_RDWR)  # wakes the worker's recv() with EOF
+                except OSError:
+                    pass
+        self._pool.shutdown(wait=False)
         if os.path.exists(SOCKET_PATH):
             os.unlink(SOCKET_PATH)
 
+    def _wake(self):
+        """Interrupt the socket server's select() (shutdown or a parked client)."""
+        try:
+            os.write(self._wake_w, b"\0")
+        except BlockingIOError:
+            pass  # pipe already full of wake-ups
+
     # ------------------------------------------------------------------ #
     # Main run loop
     # ------------------------------------------------------------------ #
 
     def run(self):
-        self._running = True
-
         # Ensure inference is running at startup if GPU is free
-        if not self._service_running():
+        self._reconcile_inference()
+        if not self._inference_running:
             self.resume_inference()
+        threading.Thread(target=self._poller, daemon=True).start()
 
         # Start watchdog
         watchdog = Watchdog(
             poll_interval=self.config.watchdog.poll_interval,
             owner_user=self.config.watchdog.owner_user,
-            on_taken=lambda source, users: self.force_pause(users),
-            on_free=lambda source: self.force_free(),
-            on_sessions_update=lambda sessions: setattr(self, 'ssh_sessions', sessions),
+            event_queue=self._watchdog_events,
+            max_poll_interval=self.config.watchdog.max_poll_interval,
+            idle_priority=self.config.watchdog.idle_priority,
+            cpu=self.config.watchdog.cpu,
         )
+        threading.Thread(target=self._watchdog_consumer, daemon=True).start()
         wt = threading.Thread(target=watchdog.run, daemon=True)
         wt.start()
 
         # Handle signals
         def shutdown(sig, frame):
             log.info("Shutting down Sentinel")
-            self._running = False
+            self._stop_event.set()
             watchdog.stop()
+            self._wake()
 
         signal.signal(signal.SIGTERM, shutdown)
         signal.signal(signal.SIGINT, shutdown)
+        # A signal may land on any thread; Python only runs the handler once the
+        # main thread (blocked in select) wakes, so have the C handler wake it.
+        signal.set_wakeup_fd(self._wake_w)
 
         # Start HTTP API if enabled
         if self.config.web.enabled:
-            start_api_server(self, self.config.web.host, self.config.web.port)
+            start_api_server(self, self.config.web.host, self.config.web.port,
+                             self.config.web.http_threads)
 
         # Start socket server (blocks until shutdown)
         self._socket_server()
@@ -3,13 +3,14 @@ Live-updating terminal monitor for Sentinel daemon state.
 Shows current SSH sessions and inference state.
 """
 
-import json
+import signal
 import socket
 import sys
 import time
 from datetime import datetime
 
 from .config import load_config, SOCKET_PATH
+from .protocol import send_msg, recv_msg
 
 
 # ANSI color codes
@@ -23,18 +24,33 @@ class Colors:
     DIM = "\033[2m"
 
 
-def get_daemon_status() -> dict:
-    """Query daemon for current status via Unix socket."""
-    try:
-        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        sock.settimeout(3)
-        sock.connect(SOCKET_PATH)
-        sock.sendall(json.dumps({"cmd": "status"}).encode())
-        data = sock.recv(4096).decode()
-        sock.close()
-        return json.loads(data)
-    except Exception:
-        return None
+class DaemonConnection:
+    """Long-lived status connection to the daemon, reconnected on failure."""
+
+    def __init__(self):
+        self._sock = None
+
+    def get_status(self) -> dict:
+        """Query daemon for current status via Unix socket."""
+        try:
+            if self._sock is None:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.settimeout(3)
+                sock.connect(SOCKET_PATH)
+                self._sock = sock
+            send_msg(self._sock, {"cmd": "status"})
+            status = recv_msg(self._sock)
+            if status is None:
+                raise ConnectionError("daemon closed the connection")
+            return status
+        except Exception:
+            self.close()
+            return None
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
 
 
 def format_time(iso_str: str) -> str:
@@ -54,46 +70,45 @@ def clear_screen():
     sys.stdout.flush()
 
 
-def render_monitor(status: dict, owner_user: str):
-    """Render the monitor display."""
-    clear_screen()
-
+def build_lines(status: dict, owner_user: str) -> list:
+    """Build the monitor display, one string per terminal row."""
+    lines = []
     now = datetime.now().strftime("%a %H:%M:%S")
-    print(f"{Colors.BOLD}=== Sentinel Monitor ==={Colors.RESET}   [{now}]")
-    print()
+    lines.append(f"{Colors.BOLD}=== Sentinel Monitor ==={Colors.RESET}   [{now}]")
+    lines.append("")
 
     if not status:
-        print(f"{Colors.RED}✗ Daemon not running{Colors.RESET}")
-        return
+        lines.append(f"{Colors.RED}✗ Daemon not running{Colors.RESET}")
+        return lines
 
     # Inference status
     service = status.get("inference_service", "ollama")
     running = status.get("inference_running", False)
     status_icon = f"{Colors.GREEN}●{Colors.RESET}" if running else f"{Colors.RED}●{Colors.RESET}"
     running_text = "running" if running else "stopped"
-    print(f"Inference:  {service} ({status_icon} {running_text})")
+    lines.append(f"Inference:  {service} ({status_icon} {running_text})")
 
     # State
     state = status.get("state", "unknown")
     state_color = Colors.GREEN if state == "idle" else Colors.YELLOW
-    print(f"State:      {state_color}{state}{Colors.RESET}")
+    lines.append(f"State:      {state_color}{state}{Colors.RESET}")
 
     if state != "idle":
         lock_holder = status.get("lock_holder", "unknown")
         lock_since = status.get("lock_since")
         if lock_since:
             since_str = format_time(lock_since)
-            print(f"Lock:       {lock_holder} (since {since_str})")
+            lines.append(f"Lock:       {lock_holder} (since {since_str})")
         else:
-            print(f"Lock:       {lock_holder}")
+            lines.append(f"Lock:       {lock_holder}")
 
-    print()
-    print("SSH Sessions:")
-    print("────────────────────────────────────────────")
+    lines.append("")
+    lines.append("SSH Sessions:")
+    lines.append("────────────────────────────────────────────")
 
     sessions = status.get("ssh_sessions", [])
     if not sessions:
-        print(f"  {Colors.DIM}(none){Colors.RESET}")
+        lines.append(f"  {Colors.DIM}(none){Colors.RESET}")
     else:
         for session in sessions:
             user = session.get("user", "?")
@@ -108,10 +123,42 @@ def render_monitor(status: dict, owner_user: str):
                 color = Colors.RED
                 marker = "[GUEST — inference paused]"
 
-            print(f"  {color}{user:<12}{Colors.RESET} {tty:<8} {from_host:<18} {marker}")
+            lines.append(f"  {color}{user:<12}{Colors.RESET} {tty:<8} {from_host:<18} {marker}")
+
+    lines.append("")
+    lines.append(f"{Colors.DIM}Ctrl+C to exit{Colors.RESET}")
+    return lines
 
-    print()
-    print(f"{Colors.DIM}Ctrl+C to exit{Colors.RESET}")
+
+class Screen:
+    """
+    Redraws only the rows that changed since the previous frame, using
+    cursor addressing instead of clearing the whole terminal every tick.
+    """
+
+    def __init__(self):
+        self._prev: list = []
+        self._full_redraw = True
+
+    def invalidate(self):
+        """Force a full clear + redraw on the next frame (e.g. after a resize)."""
+        self._full_redraw = True
+
+    def draw(self, lines: list):
+        out = []
+        if self._full_redraw:
+            out.append("\033[2J\033[H")
+            self._prev = []
+            self._full_redraw = False
+        for row, line in enumerate(lines, 1):
+            if row > len(self._prev) or self._prev[row - 1] != line:
+                out.append(f"\033[{row};1H{line}\033[K")
+        if len(lines) < len(self._prev):
+            # Display got shorter — wipe everything below the last row
+            out.append(f"\033[{len(lines) + 1};1H\033[J")
+        self._prev = list(lines)
+        sys.stdout.write("".join(out))
+        sys.stdout.flush()
 
 
 def main():
@@ -122,12 +169,17 @@ def main():
     print(f"Starting Sentinel Monitor (owner={owner_user})...")
     time.sleep(1)
 
+    conn = DaemonConnection()
+    screen = Screen()
+    signal.signal(signal.SIGWINCH, lambda sig, frame: screen.invalidate())
+
     try:
         while True:
-            status = get_daemon_status()
-            render_monitor(status, owner_user)
+            status = conn.get_status()
+            screen.draw(build_lines(status, owner_user))
             time.sleep(poll_interval)
     except KeyboardInterrupt:
+        conn.close()
         clear_screen()
         print("Monitor stopped.")
         sys.exit(0)
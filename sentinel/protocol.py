@@ -0,0 +1,53 @@
+"""
+Framing for the daemon's Unix socket.
+
+Every message — command or reply — is a 4-byte big-endian length followed
+by that many bytes of UTF-8 JSON. Framing lets a reader know when a message
+is complete regardless of how the kernel splits it, and lets a client send
+several commands on one connection.
+"""
+
+import json
+import socket
+import struct
+from typing import Any, Optional
+
+_HEADER = struct.Struct(">I")
+MAX_FRAME = 1 << 20  # refuse absurd lengths rather than allocating them
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("connection closed mid-frame")
+        buf += chunk
+    return bytes(buf)
+
+
+def send_frame(sock: socket.socket, payload: bytes):
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def recv_frame(sock: socket.socket) -> Optional[bytes]:
+    """Read one frame. Returns None if the peer closed cleanly between frames."""
+    first = sock.recv(_HEADER.size)
+    if not first:
+        return None
+    if len(first) < _HEADER.size:
+        first += _recv_exact(sock, _HEADER.size - len(first))
+    (length,) = _HEADER.unpack(first)
+    if length > MAX_FRAME:
+        raise ValueError(f"frame too large: {length} bytes")
+    return _recv_exact(sock, length)
+
+
+def send_msg(sock: socket.socket, msg: Any):
+    send_frame(sock, json.dumps(msg).encode())
+
+
+def recv_msg(sock: socket.socket) -> Any:
+    """Read one JSON message, or None on clean EOF."""
+    frame = recv_frame(sock)
+    return None if frame is None else json.loads(frame)
@@ -9,21 +9,24 @@ Usage:
 
 import os
 import sys
-import json
 import socket
 import subprocess
 import getpass
 from .config import SOCKET_PATH
+from .protocol import send_msg, recv_msg
 
 
-def _send(msg: dict) -> dict:
+def _send(msg):
+    """Send one command (dict) or a batch (list of dicts) and return the reply."""
     try:
         s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
         s.connect(SOCKET_PATH)
-        s.sendall(json.dumps(msg).encode())
-        data = s.recv(4096).decode()
+        send_msg(s, msg)
+        resp = recv_msg(s)
         s.close()
-        return json.loads(data)
+        if resp is None:
+            raise ConnectionError("daemon closed the connection without replying")
+        return resp
     except FileNotFoundError:
         print("[sentinel] ERROR: Sentinel daemon is not running. Start it with: sudo systemctl start sentinel")
         sys.exit(1)
@@ -40,9 +43,11 @@ def main():
     holder = f"{getpass.getuser()}:{' '.join(sys.argv[1:])[:60]}"
     command = sys.argv[1:]
 
-    # Acquire GPU
-    resp = _send({"cmd": "acquire", "holder": holder})
+    # Acquire GPU — batched with a status read so it's still one round trip
+    resp, status = _send([{"cmd": "acquire", "holder": holder}, {"cmd": "status"}])
     print(f"[sentinel] {resp.get('message', 'GPU acquired')}")
+    if status.get("lock_holder") and status["lock_holder"] != holder:
+        print(f"[sentinel] GPU is shared with: {status['lock_holder']}")
 
     # Run workload
     exit_code = 0
@@ -3,19 +3,20 @@ sentinel-status — show current GPU arbitration state.
 """
 
 import sys
-import json
 import socket
 from .config import SOCKET_PATH
+from .protocol import send_msg, recv_msg
 
 
 def main():
     try:
         s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
         s.connect(SOCKET_PATH)
-        s.sendall(json.dumps({"cmd": "status"}).encode())
-        data = s.recv(4096).decode()
+        send_msg(s, {"cmd": "status"})
+        status = recv_msg(s)
         s.close()
-        status = json.loads(data)
+        if status is None:
+            raise ConnectionError("daemon closed the connection without replying")
     except FileNotFoundError:
         print("Sentinel daemon is NOT running")
         sys.exit(1)
@@ -3,102 +3,337 @@ Monitors SSH sessions to detect when non-owner users are connected.
 Emits events: GPU_TAKEN (guest connected), GPU_FREE (only owner or no one)
 """
 
+import ctypes
+import mmap
+import os
+import queue
+import re
+import select
+import struct
 import subprocess
-import time
+import sys
+import threading
 import logging
-from typing import List, Dict, Callable, Optional
+from datetime import datetime
+from typing import Callable, List, Dict, NamedTuple, Optional
 
 log = logging.getLogger("sentinel.watchdog")
 
+UTMP_PATH = "/var/run/utmp"
+# struct utmp from <utmp.h> on 64-bit glibc — 384 bytes per record
+UTMP_STRUCT = struct.Struct("hi32s4s32s256shhiii4i20s")
+USER_PROCESS = 7  # ut_type of a logged-in user session
 
-def get_ssh_sessions() -> List[Dict[str, str]]:
+
+class Session(NamedTuple):
+    """One logged-in session; `from` is a keyword, hence from_."""
+    user: str
+    tty: str
+    from_: str
+    time: str
+
+    def to_dict(self) -> Dict[str, str]:
+        """The JSON shape served in status/capacity."""
+        return {"user": self.user, "tty": self.tty, "from": self.from_, "time": self.time}
+
+
+def _cstr(raw: bytes) -> str:
+    return raw.split(b"\0", 1)[0].decode(errors="replace")
+
+
+def read_utmp(path: str = UTMP_PATH, tty_prefix: bytes = b"") -> List[Session]:
     """
-    Returns list of SSH/remote sessions from `who` output.
-    Only includes pts/* entries (TTY-based remote sessions).
+    Logged-in user records straight from the utmp file — the same data
+    `who` prints, without forking it. Only records whose tty starts with
+    tty_prefix are decoded. Raises OSError if utmp is unreadable.
+    """
+    entries = []
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        size -= size % UTMP_STRUCT.size  # ignore a torn tail
+        if not size:
+            return entries
+        with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+            for rec in UTMP_STRUCT.iter_unpack(mm):
+                ut_type, _pid, line, _id, user, host = rec[:6]
+                if ut_type != USER_PROCESS or not line.startswith(tty_prefix):
+                    continue
+                entries.append(Session(
+                    sys.intern(_cstr(user)),  # pointer-equal to owner_user on compare
+                    _cstr(line),
+                    _cstr(host),
+                    datetime.fromtimestamp(rec[9]).strftime("%Y-%m-%d %H:%M"),
+                ))
+    return entries
 
-    Returns: [{"user": str, "tty": str, "from": str, "time": str}]
+
+def get_ssh_sessions() -> List[Session]:
+    """
+    Returns list of SSH/remote sessions, read from utmp (falls back to
+    parsing `who` output where utmp isn't available).
+    Only includes pts/* entries (TTY-based remote sessions).
     """
     try:
-        result = subprocess.run(
-            ["who"],
-            capture_output=True, text=True, timeout=5
-        )
-        sessions = []
-        for line in result.stdout.splitlines():
-            line = line.strip()
-            if not line:
-                continue
-            # Format: username tty date time [from]
-            # Example: benjamin pts/13 2026-02-26 18:48 (144.39.201.185)
-            # Example: mark     pts/6  2026-02-26 08:31
-            parts = line.split()
-            if len(parts) >= 2:
-                user = parts[0]
-                tty = parts[1]
-                # Only include remote TTYs (pts/*)
-                if tty.startswith("pts/"):
-                    # Extract remote host if present (at the end in parens)
-                    from_host = ""
-                    time_str = ""
-                    if len(parts) >= 4:
-                        time_str = f"{parts[2]} {parts[3]}"  # date + time
-                        if len(parts) >= 5:
-                            # Last part is the from field (in parens)
-                            from_host = parts[4].strip("()")
-                    sessions.append({
-                        "user": user,
-                        "tty": tty,
-                        "from": from_host,
-                        "time": time_str,
-                    })
-        return sessions
+        return read_utmp(tty_prefix=b"pts/")
+    except OSError as e:
+        log.debug(f"utmp unreadable ({e}), falling back to who")
+    return _who_ssh_sessions()
+
+
+# One pts/* session per match: user, tty, "date time", optional (host).
+# Example: benjamin pts/13 2026-02-26 18:48 (144.39.201.185)
+# Example: mark     pts/6  2026-02-26 08:31
+_WHO_RE = re.compile(
+    rb"^(\S+)[ \t]+(pts/\S+)(?:[ \t]+(\S+[ \t]+\S+))?(?:[ \t]+\((\S*)\))?", re.M)
+
+
+def _who_ssh_sessions() -> List[Session]:
+    """get_ssh_sessions() by parsing `who` output in a single regex pass."""
+    try:
+        result = subprocess.run(["who"], capture_output=True, timeout=5)
     except (subprocess.TimeoutExpired, FileNotFoundError) as e:
         log.warning(f"who command failed: {e}")
         return []
+    if not result.stdout.strip():
+        return []  # nobody logged in: the common idle case
+    return [
+        Session(
+            sys.intern(m.group(1).decode()),
+            m.group(2).decode(),
+            (m.group(4) or b"").decode(),
+            (m.group(3) or b"").decode(),
+        )
+        for m in _WHO_RE.finditer(result.stdout)
+    ]
+
+
+class UtmpWatch:
+    """
+    inotify(7) watch on the utmp file, so the watchdog can sleep until a
+    login/logout rewrites it instead of re-reading on a fixed timer.
+    Linux only — raises OSError where inotify or utmp is unavailable.
+
+    The watch follows the inode, so when utmp is deleted or renamed away
+    drain() re-arms it on whatever file is at the path now. Until that
+    succeeds `armed` is False and no events will arrive.
+    """
+    IN_MODIFY = 0x002
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVE_SELF = 0x800
+    IN_DELETE_SELF = 0x400
+    IN_IGNORED = 0x8000  # watch removed (file deleted, or inotify_rm_watch)
+    IN_NONBLOCK = os.O_NONBLOCK
+    IN_CLOEXEC = os.O_CLOEXEC
+    WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVE_SELF | IN_DELETE_SELF
+    GONE_MASK = IN_MOVE_SELF | IN_DELETE_SELF | IN_IGNORED
+    EVENT = struct.Struct("iIII")  # struct inotify_event: wd, mask, cookie, len (+ name)
+
+    def __init__(self, path: str = UTMP_PATH):
+        libc = ctypes.CDLL(None, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available on this platform")
+        fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._libc = libc
+        self.path = path
+        self.fd = fd
+        self.wd = -1
+        if not self._add_watch():
+            err = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(err, f"inotify_add_watch failed for {path}")
+
+    @property
+    def armed(self) -> bool:
+        return self.wd >= 0
 
+    def _add_watch(self) -> bool:
+        self.wd = self._libc.inotify_add_watch(self.fd, os.fsencode(self.path), self.WATCH_MASK)
+        return self.armed
 
-def get_guest_sessions(sessions: List[Dict[str, str]], owner_user: str) -> List[Dict[str, str]]:
+    def rearm(self) -> bool:
+        """Move the watch to the file now at path. Returns whether it's armed."""
+        if self.armed:
+            self._libc.inotify_rm_watch(self.fd, self.wd)  # fails harmlessly if already gone
+        return self._add_watch()
+
+    def drain(self):
+        """
+        Discard queued events — we only care that something changed — but
+        re-arm if the watched file itself went away.
+        """
+        gone = False
+        try:
+            while True:
+                buf = os.read(self.fd, 4096)
+                if not buf:
+                    break
+                offset = 0
+                while offset < len(buf):
+                    wd, mask, _cookie, length = self.EVENT.unpack_from(buf, offset)
+                    if wd == self.wd and mask & self.GONE_MASK:
+                        gone = True
+                    offset += self.EVENT.size + length
+        except BlockingIOError:
+            pass
+        if gone:
+            if self.rearm():
+                log.info(f"{self.path} was replaced, utmp watch re-armed")
+            else:
+                log.warning(f"{self.path} is gone, polling every poll_interval until it returns")
+
+    def close(self):
+        os.close(self.fd)
+
+
+def get_guest_sessions(sessions: List[Session], owner_user: str) -> List[Session]:
     """Filter out the owner user, return only guest sessions."""
-    return [s for s in sessions if s["user"] != owner_user]
+    return [s for s in sessions if s.user != owner_user]
 
 
 class Watchdog:
-    def __init__(self, poll_interval: int, owner_user: str,
-                 on_taken: Callable, on_free: Callable,
-                 on_sessions_update: Optional[Callable] = None):
+    """
+    Polls SSH sessions and reports changes as (kind, payload) events on
+    event_queue, so a slow consumer never delays the next poll:
+      "sessions"  {"sessions": [...]}                  session list changed
+      "taken"     {"source": "ssh", "users": {...}}    first guest logged in
+      "free"      {"source": "ssh"}                    last guest logged out
+      "roster"    {"added": {...}, "removed": {...}}   guests changed, some remain
+    """
+
+    def __init__(self, poll_interval: int, owner_user: str, event_queue: queue.Queue,
+                 max_poll_interval: Optional[int] = None,
+                 idle_priority: bool = False, cpu: Optional[int] = None,
+                 probe: Callable[[], List[Session]] = get_ssh_sessions):
         self.poll_interval = poll_interval
-        self.owner_user = owner_user
-        self.on_taken = on_taken
-        self.on_free = on_free
-        self.on_sessions_update = on_sessions_update
-        self._guests_active = False
-        self._running = False
-        self._last_sessions = []
+        self.probe = probe  # returns the current sessions; swappable for debugging
+        self.max_poll_interval = max(poll_interval, max_poll_interval or poll_interval)
+        self.owner_user = sys.intern(owner_user)
+        self.idle_priority = idle_priority
+        self.cpu = cpu
+        self._event_queue = event_queue
+        self._last_guest_users: frozenset = frozenset()
+        self._stop_event = threading.Event()
+        self._wake_r, self._wake_w = os.pipe()  # lets stop() interrupt select()
+        self._utmp_watch: Optional[UtmpWatch] = None
+        self._last_sessions_key = None  # (user, tty, from) per session at the last poll
+        self._stable_ticks = 0  # consecutive polls with an unchanged session list
+        self._guests_pending = False  # guest event for the last sent session list not yet queued
+
+    def _deprioritize(self):
+        """
+        Keep the watchdog out of the way of the workloads it watches. On
+        Linux pid 0 means the calling thread, so only this thread is affected.
+        """
+        try:
+            if self.cpu is not None:
+                os.sched_setaffinity(0, {self.cpu})
+            if self.idle_priority:
+                os.sched_setscheduler(0, os.SCHED_IDLE, os.sched_param(0))
+        except (OSError, AttributeError) as e:  # AttributeError: not Linux
+            log.warning(f"Could not lower watchdog priority: {e}")
 
     def run(self):
-        self._running = True
-        log.info(f"SSH watchdog started (owner={self.owner_user}, poll={self.poll_interval}s)")
-        while self._running:
-            sessions = get_ssh_sessions()
-            guests = get_guest_sessions(sessions, self.owner_user)
-
-            # Notify daemon of current sessions
-            if self.on_sessions_update:
-                self.on_sessions_update(sessions)
-
-            # Check for state change
-            if guests and not self._guests_active:
-                log.info(f"Guest session(s) detected: {[s['user'] for s in guests]}")
-                self._guests_active = True
-                guest_users = {s["user"] for s in guests}
-                self.on_taken(source="ssh", users=guest_users)
-            elif not guests and self._guests_active:
-                log.info("No guest sessions, GPU is free")
-                self._guests_active = False
-                self.on_free(source="ssh")
-
-            self._last_sessions = sessions
-            time.sleep(self.poll_interval)
+        self._deprioritize()
+        try:
+            self._utmp_watch = UtmpWatch()
+            mode = "utmp events"
+        except OSError as e:
+            log.info(f"utmp watch unavailable ({e}), polling only")
+            mode = "polling"
+        log.info(f"SSH watchdog started (owner={self.owner_user}, poll={self.poll_interval}s, {mode})")
+        while not self._stop_event.is_set():
+            sessions = self.probe()
+
+            # Notify daemon of current sessions, only when they changed. A
+            # list the queue couldn't take isn't recorded as sent, so the
+            # next poll still sees a change and sends it again. Guest events
+            # follow only once the daemon has the session list they go with
+            # (release() checks that list for connected guests).
+            key = tuple((s.user, s.tty, s.from_) for s in sessions)
+            changed = key != self._last_sessions_key
+            if changed and self._emit("sessions", sessions=sessions):
+                self._last_sessions_key = key
+                self._guests_pending = True
+            if self._guests_pending and key == self._last_sessions_key:
+                self._guests_pending = not self._check_guests(sessions)
+
+            self._stable_ticks = 0 if changed or self._guests_pending else self._stable_ticks + 1
+            if self._wait(self._next_interval()):
+                break
+        if self._utmp_watch is not None:
+            self._utmp_watch.close()
+            self._utmp_watch = None
+        log.info("SSH watchdog stopped")
+
+    def _check_guests(self, sessions: List[Session]):
+        """
+        Diff the guest users against the last poll. First guest in emits
+        "taken", last guest out emits "free"; guests coming and going
+        while others stay only emit "roster".
+
+        Returns False if the event couldn't be queued. The new guest set is
+        then left unrecorded and the next poll retries it; losing taken/free
+        would leave the daemon in the wrong state, losing roster a stale
+        lock_holder, until the guests change again.
+        """
+        guest_users = frozenset(s.user for s in sessions if s.user != self.owner_user)
+        last = self._last_guest_users
+        if guest_users == last:
+            return True
+        if not last:
+            log.info(f"Guest session(s) detected: {sorted(guest_users)}")
+            if not self._emit("taken", source="ssh", users=set(guest_users)):
+                return False
+        elif not guest_users:
+            log.info("No guest sessions, GPU is free")
+            if not self._emit("free", source="ssh"):
+                return False
+        else:
+            added, removed = guest_users - last, last - guest_users
+            log.info(f"Guest roster changed: +{sorted(added)} -{sorted(removed)}")
+            if not self._emit("roster", added=added, removed=removed):
+                return False
+        self._last_guest_users = guest_users
+        return True
+
+    def _emit(self, kind: str, **payload) -> bool:
+        try:
+            self._event_queue.put_nowait((kind, payload))
+            return True
+        except queue.Full:
+            log.warning(f"Watchdog event queue full, dropping {kind!r} event")
+            return False
+
+    def _next_interval(self) -> float:
+        """
+        Back off the safety-net timer while sessions stay unchanged. Only
+        with a utmp watch: logins still wake us at once, whereas in polling
+        mode (or while the watch is lost) the timer is the sole means of
+        noticing them.
+        """
+        if self._utmp_watch is None or not self._utmp_watch.armed:
+            return self.poll_interval
+        return min(self.poll_interval * 2 ** min(self._stable_ticks, 5),
+                   self.max_poll_interval)
+
+    def _wait(self, timeout: float) -> bool:
+        """
+        Sleep until utmp changes, stop() is called, or timeout elapses.
+        The timeout still re-reads sessions as a safety net for missed events.
+        Returns True if the watchdog should stop.
+        """
+        if self._utmp_watch is None:
+            return self._stop_event.wait(timeout)
+        if not self._utmp_watch.armed and self._utmp_watch.rearm():
+            log.info(f"{self._utmp_watch.path} is back, utmp watch re-armed")
+            return self._stop_event.is_set()  # re-read the new file right away
+        ready, _, _ = select.select([self._utmp_watch.fd, self._wake_r], [], [], timeout)
+        if self._utmp_watch.fd in ready:
+            self._utmp_watch.drain()
+        return self._stop_event.is_set()
 
     def stop(self):
-        self._running = False
+        self._stop_event.set()
+        os.write(self._wake_w, b"\0")